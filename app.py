@@ -1,12 +1,18 @@
 import os
-import shutil
 import ast
+import codecs
+import asyncio
+import logging
+from collections import Counter
 
-from fastapi import FastAPI, Request, UploadFile, HTTPException
+from fastapi import FastAPI, Request, HTTPException
+from python_multipart.multipart import MultipartParser, parse_options_header
 from typing import List
 
 from classify import (
+    CATEGORIES,
     classify,
+    generate_code_response,
     handle_execute_code_class,
     api_creation,
     simple_llm,
@@ -14,82 +20,279 @@ from classify import (
     query_only
 )
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 SAVE_FOLDER = "files"
 os.makedirs(SAVE_FOLDER, exist_ok=True)
 
-def save_and_decode_file(upload: UploadFile) -> dict:
-    file_path = os.path.join(SAVE_FOLDER, upload.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(upload.file, buffer)
+# Parts up to this size are held in memory and written/decoded in one go
+# (same rollover size as Starlette's SpooledTemporaryFile)
+MEMORY_FILE_LIMIT = 1024 * 1024
+
+class StreamingUpload:
+    """
+    A single uploaded file, saved to SAVE_FOLDER and decoded as UTF-8 without ever being read back from disk.
+
+    write() only buffers, so the parser can call it on the event loop; flush() and close() do the
+    disk I/O and decoding and are meant to run in a worker thread.
+    Small files are buffered whole, then written and decoded from that one buffer. Files that outgrow
+    MEMORY_FILE_LIMIT are flushed to disk and decoded chunk by chunk instead.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.file_path = os.path.join(SAVE_FOLDER, filename)
+        self.streaming = False
+        self._memory = bytearray()
+        self._pending = []  # chunks waiting for flush() once streaming
+        self._buffer = None
+        self._decoder = None
+        self._text = []
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def write(self, data: bytes):
+        if self.streaming:
+            self._pending.append(data)
+            return
+
+        self._memory += data
+        if len(self._memory) > MEMORY_FILE_LIMIT:
+            # Too large to hold: stream what we have so far and everything after it
+            self.streaming = True
+            self._pending.append(self._memory)
+            self._memory = bytearray()
+
+    def flush(self):
+        if self._buffer is None:
+            self._buffer = open(self.file_path, "wb")
+            self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+        pending, self._pending = self._pending, []
+        for data in pending:
+            self._buffer.write(data)
+            if self._decoder is not None:
+                try:
+                    self._text.append(self._decoder.decode(data))
+                except UnicodeDecodeError:
+                    # Binary content: keep saving it, stop decoding
+                    self._decoder = None
+                    self._text = []
+
+    def close(self) -> dict:
+        content = f"<binary file saved at {self.file_path}>"
+
+        if not self.streaming:
+            with open(self.file_path, "wb") as buffer:
+                buffer.write(self._memory)
+            try:
+                content = self._memory.decode("utf-8")
+            except UnicodeDecodeError:
+                pass
+        else:
+            self.flush()
+            self._buffer.close()
+            if self._decoder is not None:
+                try:
+                    self._text.append(self._decoder.decode(b"", final=True))
+                    content = "".join(self._text)
+                except UnicodeDecodeError:
+                    pass
+
+        return {
+            "filename": self.filename,
+            "content": content
+        }
+
+    def abort(self):
+        if self._buffer is not None:
+            self._buffer.close()
+
+class UploadStreamParser:
+    """
+    Incremental multipart/form-data parser that routes every file part to a StreamingUpload.
+    Non-file form fields are ignored.
+    """
+
+    def __init__(self, boundary: bytes):
+        self.current = None  # StreamingUpload still receiving data
+        self._finished = []
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition"))
+        filename = options.get(b"filename")
+        if filename:  # file upload
+            self.current = StreamingUpload(filename.decode("utf-8"))
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self.current is not None:
+            self.current.write(data[start:end])
+
+    def _on_part_end(self):
+        if self.current is not None:
+            self._finished.append(self.current)
+            self.current = None
+
+    def pop_finished(self) -> List[StreamingUpload]:
+        """
+        Uploads whose data has fully arrived since the last call, ready to close().
+        """
+        finished, self._finished = self._finished, []
+        return finished
+
+    def write(self, chunk: bytes):
+        self._parser.write(chunk)
+
+    def finalize(self):
+        self._parser.finalize()
+
+    def abort(self):
+        if self.current is not None:
+            self.current.abort()
+            self.current = None
+
+async def save_and_decode_files(request: Request) -> List[dict]:
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    parser = UploadStreamParser(params[b"boundary"])
+    saves = []
+
+    def save_finished():
+        # Finished files are written and decoded in threads while the rest of the body streams in
+        for upload in parser.pop_finished():
+            saves.append(asyncio.create_task(asyncio.to_thread(upload.close)))
 
     try:
-        with open(file_path, "rb") as f:
-            content = f.read().decode("utf-8")
-    except UnicodeDecodeError:
-        content = f"<binary file saved at {file_path}>"
+        async for chunk in request.stream():
+            parser.write(chunk)
+            save_finished()
+            if parser.current is not None and parser.current.has_pending:
+                await asyncio.to_thread(parser.current.flush)
+        parser.finalize()
+        save_finished()
     except Exception as e:
-        content = f"<error reading file: {e}>"
+        parser.abort()
+        await asyncio.gather(*saves, return_exceptions=True)
+        raise HTTPException(status_code=400, detail=f"Malformed upload: {str(e)}")
+
+    return list(await asyncio.gather(*saves))
+
+# Side-effect-free work each category starts with, run while classification is still in flight.
+# code_execution only gets its code-generation call; the others are plain LLM answers end to end.
+SPECULATIVE_STEPS = {
+    "code_execution": generate_code_response,
+    "simple_llm": simple_llm,
+    "static_answer": static_answer,
+    "query_only": query_only,
+}
+
+# Categories seen so far, used to guess which step to speculate on
+category_counts = Counter()
+
+def likely_category() -> str:
+    if not category_counts:
+        return "code_execution"
+    return category_counts.most_common(1)[0][0]
 
-    return {
-        "filename": upload.filename,
-        "content": content
-    }
+def discard_task(task: asyncio.Task):
+    # Cancel, or if it already finished, retrieve its exception so it isn't reported as unhandled
+    if not task.cancel() and not task.cancelled():
+        task.exception()
 
 app = FastAPI()
 
 @app.post("/api")
 async def upload_files(request: Request):
-    form = await request.form()
-    uploads = []
+    results = await save_and_decode_files(request)
 
-    for value in form.values():
-        if hasattr(value, "filename") and value.filename:  # file upload
-            uploads.append(value)
-
-    if not uploads:
+    if not results:
         raise HTTPException(status_code=400, detail="No files uploaded")
 
-    results = []
     question_text = None
 
-    for f in uploads:
-        file_info = save_and_decode_file(f)
-        results.append(file_info)
-
-        if f.filename.lower() in ("questions.txt", "question.txt"):
+    for file_info in results:
+        if file_info["filename"].lower() in ("questions.txt", "question.txt"):
             question_text = file_info["content"]
 
     if not question_text:
         raise HTTPException(status_code=400, detail="Missing required questions.txt file")
 
-    print(question_text)
+    logger.debug("Question: %s", question_text)
     if not question_text.strip():
         raise HTTPException(status_code=400, detail="questions.txt is empty")
 
+    guess = likely_category()
+    speculative = None
+    if guess in SPECULATIVE_STEPS:
+        speculative = asyncio.create_task(SPECULATIVE_STEPS[guess](question_text))
+
     try:
-        category = classify(question_text)
+        category = await classify(question_text)
     except Exception as e:
+        if speculative is not None:
+            discard_task(speculative)
         raise HTTPException(status_code=500, detail=f"Classification failed: {str(e)}")
 
+    # Only real categories: error strings from the classifier are unique and would grow the Counter forever
+    if category in CATEGORIES:
+        category_counts[category] += 1
+    if speculative is not None and category != guess:
+        discard_task(speculative)
+        speculative = None
+
     try:
-        print(category)
+        logger.debug("Category: %s", category)
+        speculated = await speculative if speculative is not None else None
         if category == "code_execution":
-            answer = handle_execute_code_class(question_text)
+            answer = await handle_execute_code_class(question_text, speculated)
+        elif speculative is not None:
+            # The whole handler already ran speculatively
+            answer = speculated
         elif category == "api_creation":
-            answer = api_creation(question_text)
+            answer = await api_creation(question_text)
         elif category == "simple_llm":
-            answer = simple_llm(question_text)
+            answer = await simple_llm(question_text)
         elif category == "static_answer":
-            answer = static_answer(question_text)
+            answer = await static_answer(question_text)
         elif category == "query_only":
-            answer = query_only(question_text)
+            answer = await query_only(question_text)
         else:
             answer = f"Unsupported category: {category}"
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error handling category '{category}': {str(e)}")
 
-    print(type(answer))
-    print(answer)
+    logger.debug("Raw answer (%s): %s", type(answer).__name__, answer)
 
     if isinstance(answer, str):
         try:
@@ -99,8 +302,7 @@ async def upload_files(request: Request):
         except (ValueError, SyntaxError):
             pass 
 
-    print(type(answer))
-    print(answer)
+    logger.debug("Answer (%s): %s", type(answer).__name__, answer)
             
     return answer
 
@@ -1,104 +1,245 @@
-from llm import call_grok, call_llm_with_fallback
+import re
+import time
+import asyncio
+import logging
+import functools
+from collections import deque
+from typing import Optional
+
+from llm import call_grok_with_fallback, call_llm_with_fallback, is_error_response
 from depend import manage_dependencies
-from prompt_util import generate_prompt, extract_code_and_dependencies
+from prompt_util import (
+    generate_prompt,
+    extract_code_and_dependencies,
+    render_error_log,
+    PROMPT_RETRY,
+    PROMPT_SIMPLE_LLM,
+    PROMPT_SIMULATE,
+    PROMPT_QUERY,
+    PROMPT_CLASSIFY
+)
 from exec import execute_python_code
+from semantic_cache import SemanticCache
 
-call_llm_classify = call_grok
+logger = logging.getLogger(__name__)
+
+call_llm_classify = call_grok_with_fallback
 call_llm_code = call_llm_with_fallback
 
-def classify(question: str) -> str:
-    prompt = generate_prompt(question,prompt_type="classify")
-    class_ = call_llm_classify(prompt)
+CATEGORIES = ("code_execution", "api_creation", "simple_llm", "static_answer", "query_only", "other")
+
+# Cheap local classification for unambiguous phrasings, checked in order before asking the LLM.
+# Kept deliberately narrow: a wrong match here is never corrected. No api_creation rule while
+# that handler is a stub: "create an API-compliant payload" or "create an endpoint URL" style
+# false positives would return null.
+_FAST_RULES = [
+    # Imperative scrape of a page or URL only; "what is web scraping?" goes to the LLM
+    (re.compile(r"\bscrape (the|this|data from)\b|\bscrape\b[^\n]{0,80}?https?://", re.I), "code_execution"),
+    (re.compile(r"\bwrite (a |the )?python (code|script|program)\b", re.I), "code_execution"),
+    (re.compile(r"\b(write|give|provide)\b[^.?!\n]{0,40}\b(sql|duckdb) query\b", re.I), "query_only"),
+]
+
+# Near-duplicate questions reuse earlier answers. Code generation is never cached:
+# the generated code depends on the uploaded files, not just the question.
+semantic_cache = SemanticCache()
+
+def fast_classify(question: str) -> Optional[str]:
+    """
+    Category from _FAST_RULES, or None if no rule matches.
+    """
+    for pattern, category in _FAST_RULES:
+        if pattern.search(question):
+            return category
+    return None
+
+async def classify(question: str) -> str:
+    category = fast_classify(question)
+    if category is not None:
+        return category
+
+    # Embedding (and the first-call model load) is blocking work, keep it off the event loop
+    cached = await asyncio.to_thread(semantic_cache.get, PROMPT_CLASSIFY, question)
+    if cached is not None:
+        return cached
+
+    prompt = generate_prompt(question, prompt_type=PROMPT_CLASSIFY)
+    class_ = await call_llm_classify(prompt)
     if class_:
-        return class_.strip()
+        category = class_.strip()
+        if category in CATEGORIES:
+            await asyncio.to_thread(semantic_cache.put, PROMPT_CLASSIFY, question, category)
+        return category
     else:
         raise ValueError(f"Error classifying question: {question}")
 
-def retry(question: str, code: str, error_msg: str, trial: int, max_trials=6) -> str:
-    if trial >= max_trials:
-        return f"Max retries reached. Last error: {error_msg}"
-    
-    prompt = generate_prompt(question, prompt_type="retry", code = code, error=error_msg)
-    response = call_llm_code(prompt)
-    result = extract_code_and_dependencies(response)
-    #print(result)
-    if not result["success"]:
-        print()
-        return f"Error generating retry prompt: {result['error']}"
-    code, dependencies = result["code"], result["dependencies"]
-    #print(code)
-
-    manage_dependencies(dependencies)
-
-    print(f"Retrying ({trial} attempts left)...")
-    result = execute_python_code(code)
-    
-    if result["success"]:
-        return result["output"]
-    else:
-        print(f"Retry failed: {result['error']}")
-        return retry(question, code, result['error'], trial + 1)
-
-def handle_execute_code_class(question: str):
+async def cached_llm_answer(question: str, prompt_type: str) -> str:
+    """
+    Answer question with the prompt_type template, reusing the answer to a near-duplicate question if one is cached.
+    """
+    cached = await asyncio.to_thread(semantic_cache.get, prompt_type, question)
+    if cached is not None:
+        return cached
+
+    prompt = generate_prompt(question, prompt_type=prompt_type)
+    response = await call_llm_code(prompt)
+    if not response:
+        return "No response from LLM"
+
+    response = response.strip()
+    if not is_error_response(response):
+        await asyncio.to_thread(semantic_cache.put, prompt_type, question, response)
+    return response
+
+# Wall-clock cap on all retries for one question, on top of the trial count
+RETRY_TIME_BUDGET = 120
+
+# Error log entry for a fix that returned already-failed code
+REPEATED_CODE_MSG = "The fix returned code identical to a previous failed attempt"
+
+@functools.lru_cache(maxsize=64)
+def retry_prompt(question: str, code: str, error_msg: str) -> str:
+    return generate_prompt(question, prompt_type=PROMPT_RETRY, code=code, error=error_msg)
+
+def error_kind(error_msg: str) -> str:
+    """
+    Exception name from the last line of a traceback, e.g. "KeyError", or "" if there isn't one.
+    """
+    lines = error_msg.strip().splitlines()
+    name = lines[-1].split(":", 1)[0].strip() if lines else ""
+    return name.rsplit(".", 1)[-1] if name.replace(".", "_").isidentifier() else ""
+
+def error_entry(result: dict, max_length: int = 500) -> dict:
+    """
+    Compact record of a failed execution for the retry error log: the exception name and
+    the traceback from its last frame on, capped at max_length characters.
+    """
+    error = result["error"]
+    last_frame = error.rfind('\n  File "')
+    msg = error[last_frame + 1:] if last_frame >= 0 else error
+    return {"type": error_kind(error) or result["error_type"], "msg": msg.strip()[-max_length:]}
+
+async def retry(question: str, code: str, errors: list, trial: int, max_trials=6,
+                time_budget: float = RETRY_TIME_BUDGET) -> str:
+    """
+    Ask the LLM to fix code until it runs, a limit is hit, or the time budget runs out.
+
+    Args:
+        errors: Error log of failed attempts so far, oldest first, as built by error_entry
+    """
+    deadline = time.monotonic() + time_budget
+    # (code hash, error kind) of recent failed attempts
+    attempts = deque([(hash(code), errors[-1]["type"])], maxlen=3)
+
+    for trial in range(trial, max_trials):
+        if time.monotonic() >= deadline:
+            return f"Retry time budget exhausted. Last error: {errors[-1]['msg']}"
+
+        prompt = retry_prompt(question, code, render_error_log(errors))
+        response = await call_llm_code(prompt)
+        result = extract_code_and_dependencies(response)
+        if not result["success"]:
+            return f"Error generating retry prompt: {result['error']}"
+        new_code, dependencies = result["code"], result["dependencies"]
+
+        previous_kind = next((kind for code_hash, kind in attempts if code_hash == hash(new_code)), None)
+        if previous_kind is not None:
+            # Same code already failed recently, running it again would fail the same way
+            if errors[-1]["msg"].startswith(REPEATED_CODE_MSG):
+                # Already told about it last time and it still repeats itself: stop asking
+                return f"Max retries reached. Last error: {errors[-2]['msg']}"
+            # Log it so the next prompt differs instead of repeating the cached one verbatim
+            logger.info("Retry returned previously failed code, asking again...")
+            errors.append({
+                "type": previous_kind,
+                "msg": f"{REPEATED_CODE_MSG} ({previous_kind}). Take a different approach."
+            })
+            continue
+
+        if dependencies:
+            await asyncio.to_thread(manage_dependencies, dependencies)
+
+        logger.info("Retrying (%d attempts left)...", max_trials - trial - 1)
+        result = await asyncio.to_thread(execute_python_code, new_code)
+
+        if result["success"]:
+            return result["output"]
+
+        code = new_code
+        errors.append(error_entry(result))
+        logger.info("Retry failed: %s", errors[-1]["type"])
+        attempts.append((hash(code), errors[-1]["type"]))
+
+    return f"Max retries reached. Last error: {errors[-1]['msg']}"
+
+async def generate_code_response(question: str) -> str:
+    """
+    First step of handle_execute_code_class: ask the LLM for code. No side effects, so it can run speculatively.
+    """
     prompt = generate_prompt(question)
-    response = call_llm_code(prompt)
+    return await call_llm_code(prompt)
+
+async def handle_execute_code_class(question: str, response: Optional[str] = None):
+    """
+    Generate, run and (on failure) retry code for question.
+    Pass response to reuse an LLM reply already produced by generate_code_response.
+    """
+    if response is None:
+        response = await generate_code_response(question)
     result = extract_code_and_dependencies(response)
-    print(result)
+    logger.debug("Extracted code: success=%s dependencies=%s", result["success"], result["dependencies"])
 
     if not result["success"]: 
         return f"Error generating code: {result['error']}"
     
     code, dependencies = result["code"], result["dependencies"]
 
-    manage_dependencies(dependencies)
-    result = execute_python_code(code, dependencies)
-    print(result)
+    if dependencies:
+        await asyncio.to_thread(manage_dependencies, dependencies)
+    result = await asyncio.to_thread(execute_python_code, code)
+    logger.debug("exec result rc=%s time=%s", result["return_code"], result["execution_time"])
     if not result["success"]:
-        return retry(question, code, result['error_type']+result['error'],2)
+        return await retry(question, code, [error_entry(result)], 2)
+    return result["output"]
     
-def handle_generate_code_class(question):
+async def handle_generate_code_class(question):
     prompt = generate_prompt(question)
-    response = call_llm_code(prompt)
+    response = await call_llm_code(prompt)
     result = extract_code_and_dependencies(response)
     if not result["success"]:
         return f"Error generating code: {result['error']}"
     
     return result["code"]
 
-def api_creation(question: str):
+async def api_creation(question: str):
     pass
 
-def simple_llm(question: str):
-    prompt = generate_prompt(question, prompt_type="simple_llm")
-    response = call_llm_code(prompt)
-    return response.strip() if response else "No response from LLM"
+async def simple_llm(question: str):
+    return await cached_llm_answer(question, PROMPT_SIMPLE_LLM)
 
-def static_answer(question: str):
-    prompt = generate_prompt(question, prompt_type="simulate")
-    response = call_llm_code(prompt)
-    return response.strip() if response else "No response from LLM"
+async def static_answer(question: str):
+    return await cached_llm_answer(question, PROMPT_SIMULATE)
 
-def query_only(question: str):
-    prompt = generate_prompt(question, prompt_type="query")
-    response = call_llm_code(prompt)
-    return response.strip() if response else "No response from LLM"
+async def query_only(question: str):
+    return await cached_llm_answer(question, PROMPT_QUERY)
 
-def other(question: str):
+async def other(question: str):
     prompt = generate_prompt(question)
-    response = call_llm_code(prompt)
+    response = await call_llm_code(prompt)
     result = extract_code_and_dependencies(response)
-    print(result)
+    logger.debug("Extracted code: success=%s dependencies=%s", result["success"], result["dependencies"])
 
     if not result["success"]: 
         return f"Error generating code: {result['error']}"
     
     code, dependencies = result["code"], result["dependencies"]
 
-    manage_dependencies(dependencies)
-    result = execute_python_code(code, dependencies)
-    print(result)
+    if dependencies:
+        await asyncio.to_thread(manage_dependencies, dependencies)
+    result = await asyncio.to_thread(execute_python_code, code)
+    logger.debug("exec result rc=%s time=%s", result["return_code"], result["execution_time"])
     if not result["success"]:
-        return retry(question, code, result['error_type']+result['error'],2)
+        return await retry(question, code, [error_entry(result)], 2)
+    return result["output"]
 
 
 if __name__ == "__main__":
@@ -106,5 +247,5 @@ if __name__ == "__main__":
     question = QUESTIONS[0]
     
     print("\n--- handle_execute_code_class ---")
-    output = handle_execute_code_class(question)
+    output = asyncio.run(handle_execute_code_class(question))
     print("Output:", output)
@@ -1,57 +1,106 @@
-import subprocess
+import os
+import re
 import sys
-from pathlib import Path
-from typing import List, Set
+import shutil
+import atexit
+import logging
+import functools
+import threading
+import subprocess
+import importlib.metadata
+from typing import Dict, FrozenSet, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Leading project name of a requirement specifier; stops at versions, extras, markers and URLs
+_SPEC_RE = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)")
+
+def normalize_package_name(name: str) -> str:
+    """
+    Normalize a distribution name per PEP 503 (case-insensitive, '-', '_' and '.' equivalent).
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+def package_name(dependency: str) -> Optional[str]:
+    """
+    Normalized package name of a requirement specifier such as "pandas>=1.5" or "uvicorn[standard]".
+
+    Returns:
+        Package name, or None if the line doesn't start with one (comments, pip options)
+    """
+    match = _SPEC_RE.match(dependency.lstrip())
+    return normalize_package_name(match.group(1)) if match else None
+
+# Distributions installed in this interpreter, kept current as packages get installed
+_installed: Set[str] = {
+    normalize_package_name(d.metadata["Name"])
+    for d in importlib.metadata.distributions()
+    if d.metadata["Name"]
+}
+
+# Packages whose install failed (stdlib/import names, typos, "[]" lines, ...), not retried
+_failed: Set[str] = set()
+
+# Dependencies to record in requirements files, written once at interpreter exit
+_pending_requirements: Dict[str, List[str]] = {}
+
+# Guards installs and the structures above against concurrent manage_dependencies calls
+_install_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=8)
+def _read_requirements_cached(requirements_file: str, mtime_ns: int) -> FrozenSet[str]:
+    # mtime_ns is only part of the cache key, so an edited file is parsed again
+    existing_packages = set()
+    try:
+        with open(requirements_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                name = package_name(line)
+                if name:
+                    existing_packages.add(name)
+    except IOError as e:
+        logger.error("Error reading %s: %s", requirements_file, e)
+    return frozenset(existing_packages)
 
-def read_requirements(requirements_file: str = "requirements.txt"):
+def read_requirements(requirements_file: str = "requirements.txt") -> FrozenSet[str]:
     """
     Read existing requirements from requirements.txt file.
+    Parsed once per file modification, later calls are served from cache.
     
     Args:
         requirements_file: Path to requirements.txt file
         
     Returns:
-        Set of package names from requirements.txt
+        Set of normalized package names from requirements.txt
     """
-    requirements_path = Path(requirements_file)
-    existing_packages = set()
-    
-    if requirements_path.exists():
-        try:
-            with open(requirements_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    # Skip empty lines and comments
-                    if line and not line.startswith('#'):
-                        # Extract package name (ignore version specifiers)
-                        package_name = line.split('==')[0].split('>=')[0].split('<=')[0].split('>')[0].split('<')[0].split('~=')[0].strip()
-                        existing_packages.add(package_name.lower())
-        except IOError as e:
-            print(f"Error reading {requirements_file}: {e}")
-    else:
-        print(f"{requirements_file} not found. Will create new file.")
-    
-    return existing_packages
+    try:
+        mtime_ns = os.stat(requirements_file).st_mtime_ns
+    except FileNotFoundError:
+        logger.debug("%s not found. Will create new file.", requirements_file)
+        return frozenset()
 
-def find_missing_dependencies(dependency_list: List[str], requirements_file: str = "requirements.txt") -> List[str]:
+    return _read_requirements_cached(requirements_file, mtime_ns)
+
+def find_missing_dependencies(dependency_list: List[str]) -> List[str]:
     """
-    Find dependencies that are missing from requirements.txt file.
+    Find dependencies that are not installed in the current interpreter.
+    Lines that aren't requirement specifiers, standard library modules and packages
+    that already failed to install are left out.
     
     Args:
         dependency_list: List of required dependencies
-        requirements_file: Path to requirements.txt file
         
     Returns:
         List of missing dependencies
     """
-    existing_packages = read_requirements(requirements_file)
     missing_packages = []
     
     for dependency in dependency_list:
-        # Normalize package name for comparison
-        package_name = dependency.split('==')[0].split('>=')[0].split('<=')[0].split('>')[0].split('<')[0].split('~=')[0].strip().lower()
-        if package_name not in existing_packages:
-            missing_packages.append(dependency)
+        name = package_name(dependency)
+        if name is None or name in _installed or name in _failed:
+            continue
+        if name.replace("-", "_") in sys.stdlib_module_names:
+            continue
+        missing_packages.append(dependency)
     
     return missing_packages
 
@@ -67,59 +116,70 @@ def append_to_requirements(missing_dependencies: List[str], requirements_file: s
         True if successful, False otherwise
     """
     if not missing_dependencies:
-        print("No missing dependencies to append.")
+        logger.debug("No missing dependencies to append.")
         return True
     
     try:
-        # Create file if it doesn't exist, or append if it does
-        with open(requirements_file, 'a', encoding='utf-8') as f:
-            # Add newline if file exists and doesn't end with newline
-            requirements_path = Path(requirements_file)
-            if requirements_path.exists() and requirements_path.stat().st_size > 0:
-                # Check if last character is newline
-                with open(requirements_file, 'rb') as check_file:
-                    check_file.seek(-1, 2)  # Go to last character
-                    if check_file.read(1) != b'\n':
-                        f.write('\n')
+        # Create file if it doesn't exist, or append if it does ('+' so the same fd can be read)
+        with open(requirements_file, 'a+', encoding='utf-8') as f:
+            # Append mode starts at EOF, so tell() is the file size
+            pos = f.tell()
+            # Add newline if file doesn't end with one; pread peeks without moving the append cursor
+            if pos > 0 and os.pread(f.fileno(), 1, pos - 1) != b'\n':
+                f.write('\n')
             
             # Append missing dependencies
             for dependency in missing_dependencies:
                 f.write(f"{dependency}\n")
                 
-        print(f"Successfully appended {len(missing_dependencies)} dependencies to {requirements_file}")
-        print("Appended packages:", ", ".join(missing_dependencies))
+        logger.info("Appended %d dependencies to %s: %s",
+                    len(missing_dependencies), requirements_file, ", ".join(missing_dependencies))
         return True
         
     except IOError as e:
-        print(f"Error writing to {requirements_file}: {e}")
+        logger.error("Error writing to %s: %s", requirements_file, e)
         return False
 
-def install_packages(packages: List[str], use_pip_upgrade: bool = False) -> bool:
+def _flush_pending_requirements():
     """
-    Install packages using pip via subprocess.
+    Append dependencies recorded by manage_dependencies to their requirements files.
+    """
+    with _install_lock:
+        pending = list(_pending_requirements.items())
+        _pending_requirements.clear()
+    for requirements_file, dependencies in pending:
+        existing_packages = read_requirements(requirements_file)
+        new_dependencies = []
+        for dependency in dict.fromkeys(dependencies):
+            if package_name(dependency) not in existing_packages:
+                new_dependencies.append(dependency)
+        append_to_requirements(new_dependencies, requirements_file)
+
+atexit.register(_flush_pending_requirements)
+
+def _pip_install(packages: List[str], use_pip_upgrade: bool) -> bool:
+    """
+    Run one uv/pip install for packages.
     
-    Args:
-        packages: List of package names to install
-        use_pip_upgrade: Whether to use --upgrade flag
-        
     Returns:
-        True if installation successful, False otherwise
+        True if the installer succeeded, False if it rejected the packages
     """
-    if not packages:
-        print("No packages to install.")
-        return True
-    
-    try:
+    uv = shutil.which("uv")
+    if uv:
+        # Target this interpreter explicitly, venv or not
+        cmd = [uv, "pip", "install", "--python", sys.executable]
+    else:
         cmd = [sys.executable, "-m", "pip", "install"]
+    
+    if use_pip_upgrade:
+        cmd.append("--upgrade")
         
-        if use_pip_upgrade:
-            cmd.append("--upgrade")
-            
-        cmd.extend(packages)
-        
-        print(f"Installing packages: {', '.join(packages)}")
-        print(f"Running command: {' '.join(cmd)}")
-        
+    cmd.extend(packages)
+    
+    logger.info("Installing packages: %s", ", ".join(packages))
+    logger.debug("Running command: %s", " ".join(cmd))
+    
+    try:
         # Run pip install command
         result = subprocess.run(
             cmd,
@@ -127,26 +187,52 @@ def install_packages(packages: List[str], use_pip_upgrade: bool = False) -> bool
             text=True,
             check=True
         )
+    except subprocess.CalledProcessError as e:
+        logger.error("Installation failed with return code %s\nSTDERR: %s", e.returncode, e.stderr)
+        logger.debug("STDOUT: %s", e.stdout)
+        return False
+    
+    logger.info("Installation successful")
+    logger.debug("STDOUT: %s", result.stdout)
+    _installed.update(name for name in map(package_name, packages) if name)
+    return True
+
+def install_packages(packages: List[str], use_pip_upgrade: bool = False) -> bool:
+    """
+    Install packages in one batch, with uv when available (much faster resolver) and pip otherwise.
+    Packages the installer rejects are remembered and skipped by find_missing_dependencies.
+    
+    Args:
+        packages: List of package names to install
+        use_pip_upgrade: Whether to use --upgrade flag
         
-        print("Installation successful!")
-        if result.stdout:
-            print("STDOUT:", result.stdout)
+    Returns:
+        True if installation successful, False otherwise
+    """
+    if not packages:
+        logger.debug("No packages to install.")
         return True
+    
+    try:
+        if _pip_install(packages, use_pip_upgrade):
+            return True
+        
+        # One bad name fails the whole batch; find which ones by installing them separately
+        failed = packages if len(packages) == 1 else [
+            package for package in packages if not _pip_install([package], use_pip_upgrade)
+        ]
+        _failed.update(name for name in map(package_name, failed) if name)
+        return not failed
         
-    except subprocess.CalledProcessError as e:
-        print(f"Installation failed with return code {e.returncode}")
-        print("STDERR:", e.stderr)
-        if e.stdout:
-            print("STDOUT:", e.stdout)
-        return False
     except Exception as e:
-        print(f"Unexpected error during installation: {e}")
+        logger.error("Unexpected error during installation: %s", e)
         return False
 
 def manage_dependencies(dependency_list: List[str], requirements_file: str = "requirements.txt", 
                        install_missing: bool = True, use_pip_upgrade: bool = False) -> bool:
     """
-    Main function to manage dependencies - check, append, and install missing packages.
+    Main function to manage dependencies - install missing packages and record them in
+    requirements.txt (written once at interpreter exit).
     
     Args:
         dependency_list: List of required dependencies
@@ -157,29 +243,39 @@ def manage_dependencies(dependency_list: List[str], requirements_file: str = "re
     Returns:
         True if all operations successful, False otherwise
     """
-    print(f"Checking dependencies against {requirements_file}...")
+    if not dependency_list:
+        return True
+
+    logger.debug("Checking installed dependencies...")
     
     # Find missing dependencies
-    missing_deps = find_missing_dependencies(dependency_list, requirements_file)
+    missing_deps = find_missing_dependencies(dependency_list)
     
     if not missing_deps:
-        print("All dependencies are already in requirements.txt")
+        logger.debug("All dependencies are already installed")
         return True
     
-    print(f"Found {len(missing_deps)} missing dependencies: {', '.join(missing_deps)}")
-    
-    # Append missing dependencies to requirements.txt
-    if not append_to_requirements(missing_deps, requirements_file):
-        return False
-    
-    # Install missing packages if requested
-    if install_missing:
-        return install_packages(missing_deps, use_pip_upgrade)
+    # Requests call this from worker threads; serialize installs into this interpreter
+    with _install_lock:
+        # Another request may have installed some of them while we waited
+        missing_deps = find_missing_dependencies(missing_deps)
+        if not missing_deps:
+            return True
+        
+        logger.info("Found %d missing dependencies: %s", len(missing_deps), ", ".join(missing_deps))
+        
+        # Record missing dependencies for requirements.txt
+        _pending_requirements.setdefault(requirements_file, []).extend(missing_deps)
+        
+        # Install missing packages if requested
+        if install_missing:
+            return install_packages(missing_deps, use_pip_upgrade)
     
     return True
 
 # Example usage
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     # Example dependency list
     required_dependencies = [
         "requests>=2.28.0",
@@ -2,14 +2,36 @@ import subprocess
 import sys
 import tempfile
 import os
+import shutil
+import atexit
+import threading
+import multiprocessing
 from typing import Dict, Any, Optional
-import json
+import orjson
+
+from worker_pool import PythonWorkerPool
+
+# Pre-warmed workers where forkserver is available (Linux), a fresh interpreter per call otherwise.
+# EXEC_POOL_SIZE sets how many idle workers are kept forked ahead (default: CPU count)
+_pool_size = int(os.getenv("EXEC_POOL_SIZE", "0")) or None
+_pool = PythonWorkerPool(_pool_size) if "forkserver" in multiprocessing.get_all_start_methods() else None
+
+# Subprocess fallback: one scratch dir (RAM-backed where /dev/shm exists) holding one script per thread,
+# overwritten on each call instead of creating and unlinking a temp file every time.
+# Not created with a pool: workers re-import this module and exit without running atexit
+if _pool is None:
+    _EXEC_DIR = tempfile.mkdtemp(prefix="exec_", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    atexit.register(shutil.rmtree, _EXEC_DIR, ignore_errors=True)
+
+# No .pyc writes for one-shot scripts, no buffering surprises if the process is killed
+_EXEC_ENV = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1", "PYTHONUNBUFFERED": "1"}
 
 
 def execute_python_code(code: str, timeout: int = 50, capture_stderr: bool = True, 
                        working_directory: Optional[str] = None) -> Dict[str, Any]:
     """
-    Execute Python code as a subprocess and return results or errors in a specific format.
+    Execute Python code in a pooled worker process (or a fresh subprocess when no pool is
+    available) and return results or errors in a specific format.
     
     Args:
         code: Python code string to execute
@@ -44,28 +66,31 @@ def execute_python_code(code: str, timeout: int = 50, capture_stderr: bool = Tru
         result["error_type"] = "input_validation"
         return result
     
-    temp_file = None
     start_time = time.time()
     
     try:
-        # Create temporary Python file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
-            temp_file = f.name
-            f.write(code)
-        
-        # Prepare subprocess command
-        cmd = [sys.executable, temp_file]
-        
-        # Execute the code
-        process = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            cwd=working_directory,
-            encoding='utf-8',
-            errors='replace'
-        )
+        if _pool is not None:
+            process = _pool.submit(code, timeout, working_directory)
+        else:
+            # Write this thread's script file
+            script_file = os.path.join(_EXEC_DIR, f"run_{os.getpid()}_{threading.get_ident()}.py")
+            with open(script_file, 'w', encoding='utf-8') as f:
+                f.write(code)
+
+            # Prepare subprocess command
+            cmd = [sys.executable, script_file]
+
+            # Execute the code
+            process = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                cwd=working_directory,
+                env=_EXEC_ENV,
+                encoding='utf-8',
+                errors='replace'
+            )
         
         end_time = time.time()
         result["execution_time"] = round(end_time - start_time, 3)
@@ -123,18 +148,6 @@ def execute_python_code(code: str, timeout: int = 50, capture_stderr: bool = Tru
         result["error"] = f"System error: {str(e)}"
         result["return_code"] = -1
     
-    finally:
-        # Clean up temporary file
-        if temp_file and os.path.exists(temp_file):
-            try:
-                os.unlink(temp_file)
-            except Exception as e:
-                # If cleanup fails, add note to result
-                if result["error"]:
-                    result["error"] += f"\n[Cleanup warning: Could not delete temp file: {e}]"
-                else:
-                    result["error"] = f"Cleanup warning: Could not delete temp file: {e}"
-    
     return result
 
 
@@ -195,7 +208,7 @@ result = 2 + 2
 print(f"2 + 2 = {result}")
 """
     result1 = execute_python_code(code1)
-    print("Result:", json.dumps(result1, indent=2))
+    print("Result:", orjson.dumps(result1, option=orjson.OPT_INDENT_2).decode())
     print()
     
     # Test 2: Code with error
@@ -206,7 +219,7 @@ print("But this will fail"
 # Missing closing parenthesis
 """
     result2 = execute_python_code(code2)
-    print("Result:", json.dumps(result2, indent=2))
+    print("Result:", orjson.dumps(result2, option=orjson.OPT_INDENT_2).decode())
     print()
     
     # Test 3: Runtime error
@@ -217,7 +230,7 @@ x = 1 / 0  # Division by zero
 print("This won't print")
 """
     result3 = execute_python_code(code3)
-    print("Result:", json.dumps(result3, indent=2))
+    print("Result:", orjson.dumps(result3, option=orjson.OPT_INDENT_2).decode())
     print()
     
     # Test 4: Code that takes time (but within timeout)
@@ -229,7 +242,7 @@ time.sleep(1)
 print("Finished after 1 second")
 """
     result4 = execute_python_code(code4, timeout=5)
-    print("Result:", json.dumps(result4, indent=2))
+    print("Result:", orjson.dumps(result4, option=orjson.OPT_INDENT_2).decode())
     print()
     
     # Test 5: Using simplified function
@@ -251,5 +264,5 @@ print("Code executed successfully despite warning")
 """
     result6 = execute_python_code(code6)
 
-    print("Result:", json.dumps(result6, indent=2))
+    print("Result:", orjson.dumps(result6, option=orjson.OPT_INDENT_2).decode())
 
@@ -1,11 +1,18 @@
 import os
+import time
+import httpx
 import openai
+import asyncio
+import logging
+import threading
 import subprocess
-import requests
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # API Keys
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 AIPROXY_TOKEN = os.getenv("AIPIPE_TOKEN")
@@ -20,8 +27,21 @@ OA_PROXY_MODEL = "gpt-4.1-nano"
 MODEL = "codellama:latest" 
 GROQ_MODEL = "openai/gpt-oss-20b"
 
+# Shared by all HTTP providers so calls (and retries) reuse pooled HTTP/2 connections
+_client = httpx.AsyncClient(timeout=120, http2=True, limits=httpx.Limits(max_keepalive_connections=32))
+
+# Prefixes of the error strings the call_* functions return instead of raising
+ERROR_MARKERS = ("[Groq Error]", "[OpenRouter Error]", "[Direct OpenRouter Error]", "[Ollama Error]",
+                 "[Ollama Exception]", "Unexpected response")
+
+def is_error_response(response: str) -> bool:
+    """
+    True if response is empty or one of the error strings returned by the call_* functions.
+    """
+    return not response or response.startswith(ERROR_MARKERS)
+
 # ========== LLM via Grok (personal) ==========
-def call_grok(prompt: str) -> str:
+async def call_grok(prompt: str) -> str:
     url = "https://api.groq.com/openai/v1/chat/completions"
     headers = {
         "Authorization": f"Bearer {GROK_API_KEY}",
@@ -33,14 +53,14 @@ def call_grok(prompt: str) -> str:
         "temperature": 0.3,
     }
 
-    response = requests.post(url, headers=headers, json=data, timeout=120)
+    response = await _client.post(url, headers=headers, json=data)
     try:
         return response.json()["choices"][0]["message"]["content"]
     except Exception as e:
         return f"[Groq Error]: {e} | Raw: {response.text}"
 
 # ========== LLM via OpenRouter (personal) ==========
-def call_openrouter(prompt: str) -> str:
+async def call_openrouter(prompt: str) -> str:
     url = "https://openrouter.ai/api/v1/chat/completions"
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
@@ -52,7 +72,7 @@ def call_openrouter(prompt: str) -> str:
         "temperature": 0.2,
     }
 
-    response = requests.post(url, headers=headers, json=data, timeout=120)
+    response = await _client.post(url, headers=headers, json=data)
     try:
         return response.json()["choices"][0]["message"]["content"]
     except Exception as e:
@@ -60,7 +80,7 @@ def call_openrouter(prompt: str) -> str:
 
 
 # ========== LLM via OpenRouter Proxy (TDS AI Pipe) ==========
-def call_openrouter_proxy(prompt: str) -> str:
+async def call_openrouter_proxy(prompt: str) -> str:
     API_URL = "https://aipipe.org/openrouter/v1/chat/completions"
 
     headers = {
@@ -74,7 +94,7 @@ def call_openrouter_proxy(prompt: str) -> str:
         ]
     }
 
-    response = requests.post(API_URL, headers=headers, json=payload)
+    response = await _client.post(API_URL, headers=headers, json=payload)
     response.raise_for_status()  # Raise error if request failed
     data = response.json()
 
@@ -86,7 +106,7 @@ def call_openrouter_proxy(prompt: str) -> str:
 
 
 # ========== LLM via OpenAI Proxy (TDS AI Proxy) ==========
-def call_openai_proxy(prompt):
+async def call_openai_proxy(prompt):
     API_URL = "https://aipipe.org/openai/v1/responses"
 
     headers = {
@@ -98,7 +118,7 @@ def call_openai_proxy(prompt):
         "input": prompt
     }
 
-    response = requests.post(API_URL, headers=headers, json=payload)
+    response = await _client.post(API_URL, headers=headers, json=payload)
     response.raise_for_status()  # Raise error if request failed
     data = response.json()
 
@@ -131,21 +151,27 @@ def call_ollama(prompt: str) -> str: # Change if needed
         return f"[Ollama Exception]: {e}"
 
 # ========== Groq LLM via OpenAI API ==========
-def call_groq(prompt: str) -> str:
+_groq_client = None  # Created on first use (the constructor raises without an API key)
+
+def get_groq_client() -> openai.OpenAI:
     """
-    Send a prompt to Groq LLaMA 3 model and return the response text.
+    Shared Groq client, so its connection pool is reused across calls.
     """
-    # Load environment variables
-    load_dotenv()
+    global _groq_client
 
-    # Create Groq client
-    client = openai.OpenAI(
-        base_url="https://api.groq.com/openai/v1",
-        api_key=GROK_API_KEY
-    )
+    if _groq_client is None:
+        _groq_client = openai.OpenAI(
+            base_url="https://api.groq.com/openai/v1",
+            api_key=GROK_API_KEY
+        )
+    return _groq_client
 
+def call_groq(prompt: str) -> str:
+    """
+    Send a prompt to Groq LLaMA 3 model and return the response text.
+    """
     # Send request
-    response = client.chat.completions.create(
+    response = get_groq_client().chat.completions.create(
         model="llama3-70b-8192",
         messages=[
             {"role": "system", "content": "You are a helpful assistant."},
@@ -157,33 +183,114 @@ def call_groq(prompt: str) -> str:
 
     return response.choices[0].message.content.strip()
 
-# ===== Global State for Fallback =====
-use_direct_openrouter = False  # Start with proxy, switch to direct if proxy fails
+# ===== Circuit Breakers for Fallback =====
+class CircuitBreaker:
+    """
+    Tracks whether a provider is worth calling.
 
-def call_llm_with_fallback(prompt: str) -> str:
+    CLOSED: calls go through. OPEN (after a failure): the provider is skipped until half_open_after
+    seconds have passed. HALF_OPEN: a single trial call is let through; success closes the circuit
+    again, failure re-opens it.
+    """
+    __slots__ = ("state", "opened_at", "half_open_after", "_lock")
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, half_open_after: float = 60.0):
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.half_open_after = half_open_after
+        # Plain lock: critical sections never await, and it's usable from cancellation handlers
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.half_open_after:
+                self.state = self.HALF_OPEN  # this caller makes the trial call
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """
+        Call was abandoned without an outcome; let the next caller make the trial call.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic() - self.half_open_after
+
+_breakers = {}  # provider function -> CircuitBreaker
+
+def get_breaker(provider) -> CircuitBreaker:
+    return _breakers.setdefault(provider, CircuitBreaker())
+
+async def call_with_breaker(provider, prompt: str) -> Optional[str]:
     """
-    Try OpenRouter Proxy first; on failure, switch permanently to direct OpenRouter API.
+    Call provider (any of the async call_* functions above) through its circuit breaker.
+
+    Returns:
+        The response, or None if the circuit is open or the call failed
     """
-    global use_direct_openrouter
-
-    if not use_direct_openrouter:
-        # Attempt Proxy Call
-        try:
-            response = call_openrouter_proxy(prompt)
-            # If response is empty or suspicious, treat as failure
-            if not response or "Unexpected response" in response:
-                raise RuntimeError("Empty/Unexpected Proxy response")
-            return response
-        except Exception as e:
-            print(f"⚠️ Proxy call failed, switching to direct OpenRouter. Error: {e}")
-            use_direct_openrouter = True  # Switch permanently
+    breaker = get_breaker(provider)
+    if not breaker.allow():
+        return None
+
+    try:
+        response = await provider(prompt)
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        logger.warning("%s failed, opening its circuit. Error: %s", provider.__name__, e)
+        breaker.record_failure()
+        return None
+
+    # If response is empty or suspicious, treat as failure
+    if is_error_response(response):
+        logger.warning("%s returned an error response, opening its circuit.", provider.__name__)
+        breaker.record_failure()
+        return None
+
+    breaker.record_success()
+    return response
+
+async def call_llm_with_fallback(prompt: str) -> str:
+    """
+    Try OpenRouter Proxy first; while its circuit is open, use the direct OpenRouter API instead.
+    """
+    response = await call_with_breaker(call_openrouter_proxy, prompt)
+    if response is not None:
+        return response
 
     # Fallback to direct OpenRouter
     try:
-        return call_openrouter(prompt)
+        return await call_openrouter(prompt)
     except Exception as e:
         return f"[Direct OpenRouter Error]: {e}"
 
+async def call_grok_with_fallback(prompt: str) -> str:
+    """
+    Try Groq first; while its circuit is open, use call_llm_with_fallback instead.
+    """
+    response = await call_with_breaker(call_grok, prompt)
+    if response is not None:
+        return response
+    return await call_llm_with_fallback(prompt)
+
+
 
 # ========== Example Test ==========
 if __name__ == "__main__":
@@ -192,6 +299,6 @@ if __name__ == "__main__":
     print("\n🧪 Prompt:\n", test_prompt)
 
     try:
-        print(call_grok(test_prompt))
+        print(asyncio.run(call_grok(test_prompt)))
     except Exception as e:
         print("❌ OpenRouter Error:", e)
\ No newline at end of file
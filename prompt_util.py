@@ -1,9 +1,32 @@
-import re
-from typing import Dict, List, Tuple, Optional
+import os
+import sys
+import string
+import functools
+from typing import Tuple, Optional
+
+@functools.lru_cache(maxsize=32)
+def _load_prompt_template_cached(file_path: str, mtime_ns: int) -> str:
+    # mtime_ns is only part of the cache key, so an edited template is read again
+    try:
+        # One read and one decode; text mode would buffer and decode in chunks
+        with open(file_path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Prompt template file not found: {file_path}")
+    except Exception as e:
+        raise IOError(f"Error reading template file {file_path}: {str(e)}")
+
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError as e:
+        raise IOError(f"Error reading template file {file_path}: {str(e)}")
+    # Same newline translation text mode applies (templates are checked in with CRLF)
+    return text.replace('\r\n', '\n').replace('\r', '\n')
 
 def load_prompt_template(file_path: str) -> str:
     """
     Load prompt template from a text file.
+    Read once per file modification, later calls are served from cache.
     
     Args:
         file_path: Path to the template file
@@ -16,26 +39,97 @@ def load_prompt_template(file_path: str) -> str:
         IOError: If file cannot be read
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        mtime_ns = os.stat(file_path).st_mtime_ns
     except FileNotFoundError:
         raise FileNotFoundError(f"Prompt template file not found: {file_path}")
-    except Exception as e:
+    except OSError as e:
         raise IOError(f"Error reading template file {file_path}: {str(e)}")
 
-def generate_prompt(question: str, prompt_type: str = "code", code: str = "", error: str = "", 
-                   code_template_path: str = "prompts/code.txt", retry_template_path: str = "prompts/retry.txt", simple_llm_path = "prompts/simple.txt",
-                   simulate_template_path = "prompts/simulate.txt", query_template_path = "prompts/query.txt", classify_template_path = "prompts/classify.txt") -> str:
+    return _load_prompt_template_cached(file_path, mtime_ns)
+
+@functools.lru_cache(maxsize=32)
+def _compile_template(template: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Split a str.format template into its literal segments and field names, once per template.
+    
+    Returns:
+        (literals, names) with len(literals) == len(names) + 1
+    """
+    literals, names = [], []
+    current = ""
+    for literal, name, format_spec, conversion in string.Formatter().parse(template):
+        # "{{" and "}}" escapes arrive as extra literal-only chunks
+        current += literal
+        if name is not None:
+            if format_spec or conversion:
+                raise ValueError(f"Unsupported format spec in prompt template field {{{name}}}")
+            literals.append(current)
+            names.append(name)
+            current = ""
+    literals.append(current)
+    return tuple(literals), tuple(names)
+
+def render_template(template: str, **fields: str) -> str:
+    """
+    Equivalent of template.format(**fields) for plain {name} placeholders, without
+    re-parsing the template on every call.
+    
+    Raises:
+        KeyError: If the template has a field missing from fields
     """
-    Generate appropriate prompt based on type (code or retry) using external template files.
+    literals, names = _compile_template(template)
+    if len(names) == 1:
+        return fields[names[0]].join(literals)
+    
+    parts = [literals[0]]
+    for name, literal in zip(names, literals[1:]):
+        parts.append(fields[name])
+        parts.append(literal)
+    return "".join(parts)
+
+# Prompt types; interned so dict lookups and == against them short-circuit on identity
+PROMPT_CODE = sys.intern("code")
+PROMPT_RETRY = sys.intern("retry")
+PROMPT_SIMPLE_LLM = sys.intern("simple_llm")
+PROMPT_SIMULATE = sys.intern("simulate")
+PROMPT_QUERY = sys.intern("query")
+PROMPT_CLASSIFY = sys.intern("classify")
+
+# Default template file for each prompt type
+TEMPLATE_PATHS = {
+    PROMPT_CODE: "prompts/code.txt",
+    PROMPT_RETRY: "prompts/retry.txt",
+    PROMPT_SIMPLE_LLM: "prompts/simple.txt",
+    PROMPT_SIMULATE: "prompts/simulate.txt",
+    PROMPT_QUERY: "prompts/query.txt",
+    PROMPT_CLASSIFY: "prompts/classify.txt",
+}
+
+def _get_template(prompt_type: str, template_path: Optional[str] = None) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Template text for prompt_type and the fields it fills in. Both come from
+    per-file-modification caches, so this is a stat() and two cache hits after the first call.
+    """
+    if template_path is None:
+        template_path = TEMPLATE_PATHS.get(prompt_type)
+        if template_path is None:
+            raise ValueError(f"Invalid prompt_type: {prompt_type}")
+    
+    template = load_prompt_template(template_path)
+    _, names = _compile_template(template)
+    return template, names
+
+def generate_prompt(question: str, prompt_type: str = PROMPT_CODE, code: str = "", error: str = "",
+                    template_path: Optional[str] = None) -> str:
+    """
+    Generate the prompt for prompt_type using external template files.
     
     Args:
         question: The coding question/task to solve
-        prompt_type: Either "code" for initial code generation or "retry" for debugging
-        code: Python code (required for retry prompt)
-        error: Error message (required for retry prompt)
-        code_template_path: Path to code generation template file (default: "code.txt")
-        retry_template_path: Path to retry/debugging template file (default: "retry.txt")
+        prompt_type: One of the PROMPT_* constants, e.g. PROMPT_CODE for initial code generation or PROMPT_RETRY for debugging
+        code: Python code (required by templates with a {code} field, i.e. retry)
+        error: Error message (required by templates with an {error} field, i.e. retry)
+        template_path: Template file to use instead of the prompt type's default
     
     Returns:
         Formatted prompt string
@@ -47,69 +141,91 @@ def generate_prompt(question: str, prompt_type: str = "code", code: str = "", er
     """
     
     # Validate required parameters
-    if not question or not question.strip():
+    question = question.strip() if question else ""
+    if not question:
         raise ValueError("question cannot be empty")
     
-    if prompt_type == "code":
-        # Load and format code generation template
-        template = load_prompt_template(code_template_path)
-        return template.format(question=question.strip())
-    
-    elif prompt_type == "retry":
-        if not code or not code.strip():
-            raise ValueError("code parameter is required for retry prompt")
-        if not error or not error.strip():
-            raise ValueError("error parameter is required for retry prompt")
-        
-        # Load and format retry template
-        template = load_prompt_template(retry_template_path)
-        return template.format(
-            question=question.strip(),
-            code=code.strip(),
-            error=error.strip()
-        )
-
-    elif prompt_type == "simple_llm":
-        # Load and format simple LLM template
-        template = load_prompt_template(simple_llm_path)
-        return template.format(question=question.strip())
-    
-    elif prompt_type == "simulate":
-        # Load and format simulate template
-        template = load_prompt_template(simulate_template_path)
-        return template.format(question=question.strip())
-    
-    elif prompt_type == "query":
-        # Load and format query template
-        template = load_prompt_template(query_template_path)
-        return template.format(question=question.strip())
-    
-    elif prompt_type == "classify":
-        template = load_prompt_template(classify_template_path)
-        return template.format(question=question.strip())
+    template, names = _get_template(prompt_type, template_path)
+    
+    values = {"question": question}
+    for name, value in (("code", code), ("error", error)):
+        if name in names:
+            value = value.strip() if value else ""
+            if not value:
+                raise ValueError(f"{name} parameter is required for {prompt_type} prompt")
+            values[name] = value
+    
+    return render_template(template, **values)
+
+def render_error_log(errors: list, recent: int = 2) -> str:
+    """
+    Render a retry error log for the retry prompt: the most recent errors in full, earlier ones only by type.
+    
+    Args:
+        errors: Dicts with "type" and "msg" keys, oldest first
+        recent: Number of latest errors to include in full
     
+    Returns:
+        Error text for the retry template
+    """
+    parts = []
+    earlier_types = list(dict.fromkeys(e["type"] for e in errors[:-recent] if e["type"]))
+    if earlier_types:
+        parts.append(f"Earlier attempts also failed with: {', '.join(earlier_types)}")
+    
+    latest = errors[-recent:]
+    for i, e in enumerate(latest):
+        label = "Code above" if i == len(latest) - 1 else "Previous attempt"
+        parts.append(f"[{label}] {e['type']}\n{e['msg']}")
+    
+    return "\n\n".join(parts)
+
+_FENCE = "```"
+_CODE_FENCE = "```code"
+_DEPS_FENCE = "```dependencies"
+
+def _fenced_blocks(text: str, fence: str):
+    """
+    Yield the contents of each closed block opened by fence, in order.
+    """
+    start = text.find(fence)
+    while start >= 0:
+        end = text.find(_FENCE, start + len(fence))
+        if end < 0:
+            return
+        yield text[start + len(fence):end]
+        start = text.find(fence, end + len(_FENCE))
+
+@functools.lru_cache(maxsize=512)
 def extract_code_and_dependencies(llm_response: str) -> dict:
-    try:
-        code_match = re.search(r"```code\s*(.*?)```", llm_response, re.DOTALL)
-        deps_match = re.findall(r"```dependencies\s*(.*?)```", llm_response, re.DOTALL)
+    """
+    Parse the ```code and ```dependencies blocks out of an LLM response.
+    Results are cached per response and shared between callers, so treat them as read-only.
+    """
+    if not isinstance(llm_response, str):
+        return {"success": False, "code": "", "dependencies": [], "error": "LLM response is not text"}
 
-        if not code_match:
-            return {"success": False, "code": "", "dependencies": [], "error": "Code block not found"}
+    # Plain substring scans rather than a lazy DOTALL regex: linear even on unterminated fences
+    code_start = llm_response.find(_CODE_FENCE)
+    code_end = llm_response.find(_FENCE, code_start + len(_CODE_FENCE)) if code_start >= 0 else -1
 
-        code = code_match.group(1).strip()
-        dependencies = []
-        for dep_block in deps_match:
-            dependencies.extend([line.strip() for line in dep_block.splitlines() if line.strip()])
+    if code_end < 0:
+        return {"success": False, "code": "", "dependencies": [], "error": "Code block not found"}
 
-        return {
-            "success": True,
-            "code": code,
-            "dependencies": dependencies,
-            "error": ""
-        }
+    code = llm_response[code_start + len(_CODE_FENCE):code_end].strip()
+    dependencies = [
+        dependency
+        for dep_block in _fenced_blocks(llm_response, _DEPS_FENCE)
+        for line in dep_block.splitlines()
+        if (dependency := line.strip())
+    ]
 
-    except Exception as e:
-        return {"success": False, "code": "", "dependencies": [], "error": str(e)}
+    return {
+        "success": True,
+        "code": code,
+        "dependencies": dependencies,
+        "error": ""
+    }
 
 
 # Example usage and testing
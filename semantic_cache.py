@@ -0,0 +1,115 @@
+import logging
+import functools
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+SIMILARITY_THRESHOLD = 0.95
+
+
+
+def _guard(text: str) -> Optional[str]:
+    """
+    Last paragraph of a multi-paragraph question, which a hit must match exactly; None for single-paragraph ones.
+    """
+    paragraphs = [p.strip() for p in text.strip().split("\n\n") if p.strip()]
+    return paragraphs[-1] if len(paragraphs) > 1 else None
+
+
+class SemanticCache:
+    """
+    Cache of LLM responses keyed by (prompt_type, question embedding).
+
+    A lookup hits when a question of the same prompt type with cosine similarity above
+    the threshold has been answered before, so paraphrased questions skip the LLM call.
+    Entries of different prompt types never match each other.
+
+    Questions longer than the model's input window are never cached: the model silently
+    truncates them, so two bundles sharing a long dataset description would embed alike
+    whatever they ask. Multi-paragraph questions additionally need an exact match on
+    their last paragraph, where the actual questions usually are.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, threshold: float = SIMILARITY_THRESHOLD,
+                 max_entries: int = 1024):
+        """
+        Args:
+            model_name: sentence-transformers model used to embed questions
+            threshold: Minimum cosine similarity for a hit
+            max_entries: Entries kept per prompt type; the oldest is evicted first
+        """
+        self._model_name = model_name
+        self._threshold = threshold
+        self._max_entries = max_entries
+        self._model = None
+        self._disabled = False
+        self._indexes = {}  # prompt_type -> faiss.IndexFlatIP
+        # prompt_type -> (last paragraph guard, response), aligned with index ids
+        self._responses: Dict[str, List[Tuple[Optional[str], str]]] = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._embed = functools.lru_cache(maxsize=256)(self._embed_uncached)
+
+    def _embed_uncached(self, text: str) -> Optional[np.ndarray]:
+        if self._model is None:
+            # Callers run on worker threads; load the model only once
+            with self._load_lock:
+                if self._model is None and not self._disabled:
+                    try:
+                        # Imported lazily: torch/faiss add seconds to startup
+                        import faiss
+                        from sentence_transformers import SentenceTransformer
+                        self._faiss = faiss
+                        self._model = SentenceTransformer(self._model_name)
+                    except Exception as e:
+                        logger.warning("Semantic cache disabled: %s", e)
+                        self._disabled = True
+        if self._disabled:
+            return None
+        tokens = self._model.tokenizer(text, add_special_tokens=True, truncation=False, verbose=False)["input_ids"]
+        if len(tokens) > self._model.max_seq_length:
+            return None
+        return self._model.encode([text], normalize_embeddings=True).astype(np.float32)
+
+    def get(self, prompt_type: str, text: str) -> Optional[str]:
+        """
+        Return the cached response for a near-duplicate of text, or None on a miss.
+        """
+        embedding = self._embed(text)
+        if embedding is None:
+            return None
+
+        with self._lock:
+            index = self._indexes.get(prompt_type)
+            if index is None or index.ntotal == 0:
+                return None
+            scores, ids = index.search(embedding, 1)
+            if scores[0][0] >= self._threshold:
+                guard, response = self._responses[prompt_type][ids[0][0]]
+                if guard == _guard(text):
+                    return response
+        return None
+
+    def put(self, prompt_type: str, text: str, response: str):
+        """
+        Store response for text under prompt_type.
+        """
+        embedding = self._embed(text)
+        if embedding is None:
+            return
+
+        with self._lock:
+            index = self._indexes.get(prompt_type)
+            if index is None:
+                index = self._indexes[prompt_type] = self._faiss.IndexFlatIP(embedding.shape[1])
+                self._responses[prompt_type] = []
+            if index.ntotal >= self._max_entries:
+                # IndexFlat renumbers remaining ids, keeping them aligned with the list
+                index.remove_ids(np.array([0], dtype=np.int64))
+                self._responses[prompt_type].pop(0)
+            index.add(embedding)
+            self._responses[prompt_type].append((_guard(text), response))
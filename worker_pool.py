@@ -0,0 +1,281 @@
+import io
+import os
+import sys
+import orjson
+import queue
+import types
+import tempfile
+import atexit
+import importlib
+import signal
+import threading
+import traceback
+import subprocess
+import multiprocessing
+from typing import Dict, Any, List, Optional
+
+# Imported once in the forkserver so every worker starts with them already loaded
+PRELOAD_MODULES = ["pandas", "numpy", "matplotlib", "requests"]
+
+SUBMITTED_NAME = "<submitted>"
+
+# RAM-backed where available, like the subprocess fallback's script directory
+_SCRATCH_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+class _ExecTimeout(BaseException):
+    """
+    Raised inside a worker when submitted code exceeds its time limit.
+    Derives from BaseException so a bare `except Exception` in the submitted code can't swallow it.
+    """
+
+
+def _on_alarm(signum, frame):
+    raise _ExecTimeout()
+
+
+def _run_submitted(script_file: str, stdout_file: str, stderr_file: str, timeout: Optional[float],
+                   working_directory: Optional[str]) -> Dict[str, Any]:
+    """
+    Run a script in this (fresh, single-use) worker, mimicking `python -u script.py` as closely
+    as possible: the script runs as a real __main__ module, and fds 1 and 2 go to the capture
+    files so output of child processes and C extensions is captured too.
+
+    Returns:
+        Dict with exc_type (None, exception class name, or "timeout") and return_code
+    """
+    for fd, path in ((1, stdout_file), (2, stderr_file)):
+        capture = os.open(path, os.O_WRONLY)
+        os.dup2(capture, fd)
+        os.close(capture)
+    # Unbuffered like PYTHONUNBUFFERED=1, so nothing is lost if the script calls os._exit()
+    sys.stdout = io.TextIOWrapper(io.FileIO(1, "w", closefd=False), encoding="utf-8", write_through=True)
+    sys.stderr = io.TextIOWrapper(io.FileIO(2, "w", closefd=False), encoding="utf-8",
+                                  errors="backslashreplace", write_through=True)
+
+    exc_type = None
+    return_code = 0
+
+    try:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            if working_directory:
+                os.chdir(working_directory)
+            # Pick up packages installed since the forkserver started
+            importlib.invalidate_caches()
+            sys.argv = [script_file]
+            sys.path[0] = os.path.dirname(script_file)
+            # A real module in sys.modules, so pickling, get_type_hints and multiprocessing
+            # can find what the script defines
+            main = types.ModuleType("__main__")
+            main.__file__ = script_file
+            sys.modules["__main__"] = main
+            with open(script_file, encoding="utf-8") as f:
+                source = f.read()
+            exec(compile(source, script_file, "exec"), main.__dict__)
+        except SystemExit as e:
+            # Same exit code rules as the interpreter
+            if e.code is None:
+                return_code = 0
+            elif isinstance(e.code, int):
+                return_code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                return_code = 1
+            if return_code:
+                exc_type = "SystemExit"
+        except _ExecTimeout:
+            raise
+        except BaseException as e:
+            exc_type = type(e).__name__
+            # Skip this frame so the traceback reads like the script was run directly
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+            return_code = 1
+    except _ExecTimeout:
+        exc_type = "timeout"
+        return_code = -1
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except Exception:
+            pass
+
+    return {"exc_type": exc_type, "return_code": return_code}
+
+
+def _worker_main(conn):
+    """
+    Worker body: receive one request naming the script and capture files, reply with the
+    run result and exit. Messages are orjson blobs; Connection.send_bytes already length-prefixes each one.
+    """
+    signal.signal(signal.SIGALRM, _on_alarm)
+    try:
+        request = orjson.loads(conn.recv_bytes())
+    except EOFError:
+        return
+    reply = _run_submitted(**request)
+    conn.send_bytes(orjson.dumps(reply))
+    conn.close()
+
+
+def _new_file(suffix: str, content: bytes = b"") -> str:
+    fd, path = tempfile.mkstemp(prefix="run_", suffix=suffix, dir=_SCRATCH_DIR)
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    return path
+
+
+def _read_capture(path: str) -> str:
+    try:
+        with open(path, "rb") as f:
+            return f.read().decode("utf-8", errors="replace")
+    except FileNotFoundError:
+        return ""
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+
+class PythonWorkerPool:
+    """
+    Pre-forked Python workers from a forkserver with common data libraries preloaded, so
+    running generated code doesn't pay interpreter startup and pandas/numpy/matplotlib imports
+    on every call.
+
+    Each worker runs exactly one submission and exits, so nothing one run does to module
+    state leaks into the next. The pool keeps `size` idle workers forked ahead of time;
+    when they are all taken a worker is forked on demand, so concurrency is not capped.
+
+    Like any forkserver-based pool, the entry script must be import-safe
+    (top-level work guarded by `if __name__ == "__main__":`).
+    """
+
+    def __init__(self, size: Optional[int] = None, preload: List[str] = PRELOAD_MODULES, grace_period: float = 5.0):
+        """
+        Args:
+            size: Idle workers kept forked ahead of time (default: CPU count)
+            preload: Modules imported once in the forkserver
+            grace_period: Extra seconds to wait past the timeout before killing an unresponsive worker
+        """
+        self._ctx = multiprocessing.get_context("forkserver")
+        self._ctx.set_forkserver_preload(list(preload))
+        self._size = size if size is not None else (os.cpu_count() or 2)
+        self._grace_period = grace_period
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._replenish_lock = threading.Lock()
+        self._live = set()
+        # Workers aren't daemonic (so submitted code can start its own processes), which
+        # means multiprocessing would wait for idle ones at exit: kill them first instead
+        atexit.register(self.close)
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(target=_worker_main, args=(child_conn,))
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        with self._lock:
+            self._live.add(worker)
+        return worker
+
+    def _acquire(self) -> _Worker:
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return self._spawn()
+            if worker.process.is_alive():
+                return worker
+            self._discard(worker)
+
+    def _replenish(self):
+        # Serialized so concurrent submits don't overshoot the idle target
+        with self._replenish_lock:
+            while self._idle.qsize() < self._size:
+                self._idle.put(self._spawn())
+
+    def _discard(self, worker: _Worker, exit_wait: float = 0):
+        worker.conn.close()
+        if exit_wait:
+            # Let a worker that has replied run its exit cleanup (e.g. unlinking semaphores)
+            worker.process.join(timeout=exit_wait)
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(timeout=1)
+        with self._lock:
+            self._live.discard(worker)
+
+    def close(self):
+        """
+        Kill all workers, idle or running.
+        """
+        with self._lock:
+            workers = list(self._live)
+        for worker in workers:
+            self._discard(worker)
+
+    def submit(self, code: str, timeout: Optional[float] = None,
+               working_directory: Optional[str] = None) -> subprocess.CompletedProcess:
+        """
+        Run code in a fresh pre-forked worker.
+
+        Returns:
+            subprocess.CompletedProcess, so callers can treat it like `subprocess.run(..., text=True)`
+
+        Raises:
+            subprocess.TimeoutExpired: If the code runs longer than timeout
+        """
+        worker = self._acquire()
+        # The parent owns the script and capture files, so output survives a worker that dies mid-run
+        request = {
+            "script_file": _new_file(".py", code.encode("utf-8")),
+            "stdout_file": _new_file(".out"),
+            "stderr_file": _new_file(".err"),
+            "timeout": timeout,
+            "working_directory": working_directory
+        }
+
+        reply = None
+        try:
+            try:
+                worker.conn.send_bytes(orjson.dumps(request))
+                # Fork the next spare while this one runs
+                self._replenish()
+                wait = None if timeout is None else timeout + self._grace_period
+                # Stuck somewhere SIGALRM can't interrupt (e.g. inside C code) if this runs out
+                timed_out = not worker.conn.poll(wait)
+                reply = None if timed_out else orjson.loads(worker.conn.recv_bytes())
+            except (EOFError, BrokenPipeError):
+                # Worker exited without replying (os._exit, segfault, OOM kill, ...)
+                timed_out = False
+            finally:
+                # Single use: done with the worker whether it replied, exited or hung
+                self._discard(worker, exit_wait=1 if reply is not None else 0)
+
+            stdout = _read_capture(request["stdout_file"])
+            stderr = _read_capture(request["stderr_file"])
+        finally:
+            for key in ("script_file", "stdout_file", "stderr_file"):
+                os.unlink(request[key])
+
+        if timed_out or (reply is not None and reply["exc_type"] == "timeout"):
+            raise subprocess.TimeoutExpired(SUBMITTED_NAME, timeout, output=stdout, stderr=stderr)
+
+        if reply is None:
+            # Report the process exit status, as the subprocess path would
+            return_code = worker.process.exitcode
+            if return_code is None:
+                return_code = -1
+            if return_code and not stderr:
+                stderr = f"Worker process exited unexpectedly (exit code: {return_code})"
+            return subprocess.CompletedProcess(SUBMITTED_NAME, return_code, stdout, stderr)
+
+        return subprocess.CompletedProcess(SUBMITTED_NAME, reply["return_code"], stdout, stderr)